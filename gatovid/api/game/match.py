@@ -539,6 +539,23 @@ class MatchManager:
         # Eliminar con seguridad (para evitar crashes)
         matches.pop(code, None)
 
+    def clear(self) -> None:
+        """
+        Termina todas las partidas y vacía la cola de espera, cancelando sus
+        timers. Usado para pruebas, de forma que no queden partidas activas de
+        una prueba a otra.
+        """
+
+        with self._public_lock:
+            if self._public_timer is not None:
+                self._public_timer.cancel()
+                self._public_timer = None
+
+            self.users_waiting.clear()
+
+        for match in list(matches.values()):
+            match.end()
+
     def get_waiting(self) -> List[User]:
         """
         Devuelve el máximo de jugadores (y los elimina de la cola de espera)
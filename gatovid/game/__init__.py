@@ -164,7 +164,7 @@ class Game:
         self._paused = False
         self._paused_by = ""
         self._paused_lock = threading.Lock()
-        self._paused_timer = None
+        self._pause_timer = None
 
         self._finished = False
         self._players_finished = 0
@@ -847,7 +847,7 @@ class Game:
         self._finished = True
         if self._turn_timer is not None:
             self._turn_timer.cancel()
-        if self._paused_timer is not None:
-            self._paused_timer.cancel()
+        if self._pause_timer is not None:
+            self._pause_timer.cancel()
 
         return self.finish_update()
@@ -4,7 +4,7 @@ pilas de cartas dentro de los cuerpos.
 """
 
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from gatovid.game.cards import Card, Color, Medicine, Organ, SimpleCard, Virus
 from gatovid.game.common import GameLogicException
@@ -47,6 +47,16 @@ class OrganPile:
 
         return out
 
+    def to_plain(self) -> Dict:
+        """
+        Devuelve la pila en el mismo formato que queda al codificarla en JSON.
+        Usado para pruebas.
+        """
+        return {
+            "organ": None if self.organ is None else self.organ.to_plain(),
+            "modifiers": [mod.to_plain() for mod in self.modifiers],
+        }
+
     def set_organ(self, organ: Organ):
         """
         Establece el órgano como base de la pila.
@@ -1,5 +1,5 @@
 import random
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from enum import Enum
 from typing import TYPE_CHECKING, Dict, List, Optional
 
@@ -58,6 +58,25 @@ class Card:
     def is_placeable(self) -> bool:
         return False
 
+    def as_dict(self) -> Dict:
+        """
+        Equivalente a `dataclasses.asdict`, pero sin la copia recursiva, ya que
+        ninguna carta tiene campos compuestos.
+        """
+
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+    def to_plain(self) -> Dict:
+        """
+        Como `as_dict`, pero con el valor de los Enum en lugar de la instancia,
+        igual que queda al codificarlo en JSON. Usado para pruebas.
+        """
+
+        return {
+            key: value.value if isinstance(value, Enum) else value
+            for key, value in self.as_dict().items()
+        }
+
 
 @dataclass
 class SimpleCard(Card):
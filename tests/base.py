@@ -1,5 +1,7 @@
+import threading
 import time
-from typing import Dict, List, Optional
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 from flask_testing import TestCase
@@ -150,6 +152,151 @@ class GatovidTestClient(BaseTestCase):
         )
 
 
+class VirtualTimer:
+    """
+    Sustituto de `gatovid.util.Timer` para las pruebas, con su misma interfaz.
+    En vez de usar un thread, el temporizador se ejecuta cuando el
+    `VirtualClock` al que pertenece llega a su vencimiento.
+    """
+
+    def __init__(
+        self, clock, interval: float, function: Callable, args=None, kwargs=None
+    ) -> None:
+        self._clock = clock
+        self._interval = interval
+        self._function = function
+        self._args = args if args is not None else []
+        self._kwargs = kwargs if kwargs is not None else {}
+
+        # Momento del reloj en el que vence mientras está en marcha, y tiempo
+        # que le queda mientras está pausado.
+        self.deadline = None
+        self._remaining = None
+        self._started = False
+        self._paused = False
+
+    def is_started(self) -> bool:
+        return self._started
+
+    def is_paused(self) -> bool:
+        return self._paused
+
+    def start(self) -> None:
+        self._started = True
+        self._clock.schedule(self, self._interval)
+
+    def cancel(self) -> None:
+        self._clock.unschedule(self)
+
+    def remaining_secs(self) -> Optional[float]:
+        if not self.is_started():
+            return None
+
+        if self.is_paused():
+            return self._remaining
+
+        return self.deadline - self._clock.now
+
+    def pause(self) -> None:
+        if not self.is_started():
+            raise ValueError("Timer not started")
+
+        if self.is_paused():
+            raise ValueError("Timer already paused")
+
+        self._remaining = self.deadline - self._clock.now
+        self._paused = True
+        self._clock.unschedule(self)
+
+    def resume(self) -> None:
+        if not self.is_started():
+            raise ValueError("Timer not started")
+
+        if not self.is_paused():
+            raise ValueError("Timer already running")
+
+        self._paused = False
+        self._clock.schedule(self, self._remaining)
+
+    def fire(self) -> None:
+        self._function(*self._args, **self._kwargs)
+
+
+class VirtualClock:
+    """
+    Reloj controlado manualmente desde las pruebas. Los temporizadores creados
+    con `timer` solo se ejecutan al avanzarlo, en el mismo thread que la
+    prueba y por orden de vencimiento, por lo que no hace falta esperar tiempo
+    real ni hay problemas de sincronización.
+    """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self._pending = []
+
+    def timer(self, interval: float, *args, **kwargs) -> VirtualTimer:
+        """
+        Crea un temporizador asociado a este reloj, con los mismos argumentos
+        que `gatovid.util.Timer`.
+        """
+
+        return VirtualTimer(self, interval, *args, **kwargs)
+
+    def schedule(self, timer: VirtualTimer, delay: float) -> None:
+        timer.deadline = self.now + delay
+        self._pending.append(timer)
+
+    def unschedule(self, timer: VirtualTimer) -> None:
+        if timer in self._pending:
+            self._pending.remove(timer)
+
+    def fire_next(self, until: float) -> bool:
+        """
+        Ejecuta el siguiente temporizador pendiente si vence como mucho en
+        `until`, adelantando el reloj hasta su vencimiento. Devuelve si se ha
+        ejecutado alguno.
+        """
+
+        if not self._pending:
+            return False
+
+        timer = min(self._pending, key=lambda t: t.deadline)
+        if timer.deadline > until:
+            return False
+
+        self._pending.remove(timer)
+        self.now = max(self.now, timer.deadline)
+        timer.fire()
+        return True
+
+    def advance(self, secs: float) -> None:
+        """
+        Avanza el reloj `secs` segundos, ejecutando todos los temporizadores
+        que venzan mientras tanto (incluidos los que se inicien al hacerlo).
+        """
+
+        until = self.now + secs
+        while self.fire_next(until):
+            pass
+
+        self.now = until
+
+    def advance_until(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """
+        Equivalente a `threading.Condition.wait_for`: ejecuta los temporizadores
+        uno a uno hasta que se cumpla `predicate`, como mucho durante `timeout`
+        segundos. Devuelve si se ha cumplido.
+        """
+
+        until = self.now + timeout
+        while not predicate():
+            if not self.fire_next(until):
+                self.now = until
+                return False
+
+        return True
+
+
 class WsTestClient(GatovidTestClient):
     """
     Clase para realizar tests, extendida con un cliente websocket para
@@ -158,6 +305,11 @@ class WsTestClient(GatovidTestClient):
 
     clients = []
     matchmaking_delay = 0.0
+    # Se notifica cada vez que el servidor envía un mensaje a cualquier cliente,
+    # para poder esperar a que llegue sin tener que consultar periódicamente.
+    received_cond = threading.Condition()
+    # Reloj virtual de los temporizadores del servidor, si se usa en la prueba.
+    clock = None
 
     users_data = [
         {
@@ -169,11 +321,21 @@ class WsTestClient(GatovidTestClient):
     ]
 
     player_names = [GENERIC_USERS_NAME.format(i) for i in range(NUM_GENERIC_USERS)]
+    # Posición de cada jugador en `player_names` (y por tanto de su cliente en
+    # `create_game`), para no tener que buscarlo en la lista.
+    player_index = {name: i for (i, name) in enumerate(player_names)}
 
     def create_app(self):
         self.app = super().create_app()
         return self.app
 
+    def setUp(self):
+        super().setUp()
+
+        # Tokens de acceso por email, solo válidos durante la prueba dado que la
+        # base de datos se reinicia en cada una.
+        self.access_tokens = {}
+
     def tearDown(self):
         super().tearDown()
 
@@ -183,10 +345,41 @@ class WsTestClient(GatovidTestClient):
             except RuntimeError:
                 # Ignoramos si el cliente no se ha conectado
                 pass
+        self.clients.clear()
+
+        # Se terminan las partidas que hayan quedado abiertas, para que sus
+        # timers no sigan activos en el resto de pruebas.
+        gatovid.api.game.match.MM.clear()
 
         self.reset_timeouts()
         self.restore_default_deck()
 
+    def assertCallbackOk(self, callback_args):
+        if "error" in callback_args:
+            self.fail(f"description: {callback_args}")
+
+    def assertCallbackErr(self, callback_args):
+        if "error" not in callback_args:
+            self.fail(f"description: {callback_args}")
+
+    def emit_ok(self, client, event: str, *args) -> Dict:
+        """
+        Envía el evento `event` y comprueba que la respuesta no es un error.
+        """
+
+        callback_args = client.emit(event, *args, callback=True)
+        self.assertCallbackOk(callback_args)
+        return callback_args
+
+    def emit_err(self, client, event: str, *args) -> Dict:
+        """
+        Envía el evento `event` y comprueba que la respuesta es un error.
+        """
+
+        callback_args = client.emit(event, *args, callback=True)
+        self.assertCallbackErr(callback_args)
+        return callback_args
+
     def reset_timeouts(self) -> None:
         """
         Reinicia los timeouts establecidos para las pruebas de forma manual.
@@ -196,21 +389,117 @@ class WsTestClient(GatovidTestClient):
         self.set_pause_timeout(DEFAULT_TIME_UNTIL_RESUME)
         self.set_turn_timeout(DEFAULT_TIME_TURN_END)
 
-    def create_client(self, user_data: Dict[str, str]):
-        resp = self.request_token(user_data)
+    def use_virtual_clock(self) -> None:
+        """
+        Sustituye los temporizadores del servidor (turnos, pausas y
+        matchmaking) por unos virtuales durante la prueba. Las esperas de esta
+        clase avanzarán entonces el reloj en vez de dormir.
+        """
 
-        self.assertRequestOk(resp)
-        self.assertIn("access_token", resp.json)
+        self.clock = VirtualClock()
 
-        client = socket.test_client(
-            self.app, headers=self.auth_headers(resp.json["access_token"])
-        )
+        for module in (gatovid.game, gatovid.api.game.match):
+            self.addCleanup(setattr, module, "Timer", module.Timer)
+            module.Timer = self.clock.timer
+
+    def wait_secs(self, secs: float) -> None:
+        """
+        Espera `secs` segundos, en el reloj virtual si se está usando.
+        """
+
+        if self.clock is not None:
+            self.clock.advance(secs)
+        else:
+            time.sleep(secs)
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """
+        Espera como mucho `timeout` segundos a que se cumpla `predicate` tras
+        algún mensaje del servidor. Devuelve si se ha cumplido.
+        """
+
+        if self.clock is not None:
+            return self.clock.advance_until(predicate, timeout)
+
+        with self.received_cond:
+            return self.received_cond.wait_for(predicate, timeout)
+
+    def get_access_token(self, user_data: Dict[str, str]) -> str:
+        """
+        Inicia sesión con el usuario la primera vez que se necesita en la
+        prueba, reutilizando el token en las siguientes conexiones (por ejemplo
+        al reconectarse).
+        """
+
+        email = user_data["email"]
+        if email not in self.access_tokens:
+            resp = self.request_token(user_data)
+
+            self.assertRequestOk(resp)
+            self.assertIn("access_token", resp.json)
+
+            self.access_tokens[email] = resp.json["access_token"]
+
+        return self.access_tokens[email]
+
+    def create_client(self, user_data: Dict[str, str]):
+        token = self.get_access_token(user_data)
+        client = socket.test_client(self.app, headers=self.auth_headers(token))
+        # Cada cliente nuevo sustituye la función de envío del servidor, por lo
+        # que hay que volver a envolverla.
+        socket.server._send_packet = self._notify_received(socket.server._send_packet)
 
         # Lo guardamos para poder "limpiarlo" más tarde
         self.clients.append(client)
         return client
 
+    def _notify_received(self, send_packet):
+        """
+        Envuelve la función con la que el servidor envía los mensajes al
+        cliente de pruebas para que avise en `received_cond` de cada uno.
+        """
+
+        def wrapper(eio_sid, pkt):
+            with self.received_cond:
+                send_packet(eio_sid, pkt)
+                self.received_cond.notify_all()
+
+        return wrapper
+
+    def wait_received(self, client, timeout: float) -> List:
+        """
+        Espera como mucho `timeout` segundos a que `client` reciba algún
+        mensaje, y devuelve todos los que tenga hasta el momento.
+        """
+
+        def arrived():
+            return len(client.queue[client.eio_sid]) > 0
+
+        self.wait_until(arrived, timeout)
+        return client.get_received()
+
+    def wait_msg(self, client, msg_type: str, timeout: float) -> bool:
+        """
+        Espera como mucho `timeout` segundos a que `client` reciba un mensaje
+        de tipo `msg_type`, sin sacarlo de los recibidos. Devuelve si ha
+        llegado.
+        """
+
+        def arrived():
+            queue = client.queue[client.eio_sid]
+            return any(msg["name"] == msg_type for msg in queue)
+
+        return self.wait_until(arrived, timeout)
+
     def parse_json_args(self, args):
+        """
+        Junta los argumentos de un mensaje en un único diccionario. El cliente
+        de pruebas ya los entrega decodificados, y casi siempre con un único
+        argumento, en cuyo caso no hace falta copiarlo.
+        """
+        if len(args) == 1:
+            return args[0]
+
         return dict((key, arg[key]) for arg in args for key in arg)
 
     def get_msg_in_received(
@@ -227,11 +516,9 @@ class WsTestClient(GatovidTestClient):
             return msg["name"] == msg_type
 
         if last:
-            raw = None
-            for raw in filter(query, received):
-                pass
-        else:
-            raw = next(iter(filter(query, received)), None)
+            received = reversed(received)
+
+        raw = next(filter(query, received), None)
 
         if raw is None:
             return None, None
@@ -243,6 +530,23 @@ class WsTestClient(GatovidTestClient):
 
         return raw, args
 
+    def index_received(self, received: List, json: bool = False) -> Dict[str, List]:
+        """
+        Agrupa en una sola pasada los argumentos de los mensajes de `received`
+        según su tipo, en el orden en el que se recibieron. Útil cuando se
+        buscan varios tipos de mensaje en los mismos recibidos.
+        """
+
+        index = defaultdict(list)
+        for msg in received:
+            args = msg["args"]
+            if args and json:
+                args = self.parse_json_args(args)
+
+            index[msg["name"]].append(args)
+
+        return index
+
     def set_matchmaking_time(self, delay: float):
         """
         Para los tests se parchea el tiempo de espera para el inicio de la
@@ -260,7 +564,7 @@ class WsTestClient(GatovidTestClient):
         procesamiento en el backend.
         """
 
-        time.sleep(self.matchmaking_delay * 1.2)
+        self.wait_secs(self.matchmaking_delay * 1.2)
 
     def set_pause_timeout(self, delay: float):
         """
@@ -279,7 +583,7 @@ class WsTestClient(GatovidTestClient):
         procesamiento en el backend.
         """
 
-        time.sleep(self.pause_timeout * 1.2)
+        self.wait_secs(self.pause_timeout * 1.2)
 
     def set_turn_timeout(self, delay: float):
         """
@@ -292,13 +596,18 @@ class WsTestClient(GatovidTestClient):
         gatovid.game.TIME_TURN_END = delay
         self.turn_time = delay
 
-    def wait_turn_timeout(self):
+    def wait_turn_timeout(self, client) -> bool:
         """
-        Espera el tiempo de turno, con un pequeño margen para el procesamiento
-        en el backend.
+        Espera a que termine el turno actual, es decir, a que `client` reciba
+        el `game_update` del fin de turno, con un pequeño margen sobre el tiempo
+        de turno para el procesamiento en el backend. Devuelve si ha llegado.
+
+        Se espera al mensaje y no un tiempo fijo porque con el reloj virtual
+        el margen se iría acumulando y una misma espera podría terminar dos
+        turnos.
         """
 
-        time.sleep(self.turn_time * 1.2)
+        return self.wait_msg(client, "game_update", self.turn_time * 1.2)
 
     def create_game(self, players=6):
         clients = []
@@ -315,11 +624,11 @@ class WsTestClient(GatovidTestClient):
         # Unimos a los clientes a la partida
         for client in clients[1:]:
             callback_args = client.emit("join", code, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.assertCallbackOk(callback_args)
 
         # Empezamos la partida
         callback_args = clients[0].emit("start_game", callback=True)
-        self.assertNotIn("error", callback_args)
+        self.assertCallbackOk(callback_args)
 
         return clients, code
 
@@ -331,7 +640,7 @@ class WsTestClient(GatovidTestClient):
 
         for client in clients:
             callback_args = client.emit("search_game", callback=True)
-            self.assertNotIn("error", callback_args)
+            self.assertCallbackOk(callback_args)
 
         # Se unen a la partida
         code = None
@@ -341,7 +650,7 @@ class WsTestClient(GatovidTestClient):
             self.assertIn("code", args)
             code = args["code"]
             callback_args = client.emit("join", code, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.assertCallbackOk(callback_args)
 
         return clients, code
 
@@ -354,7 +663,7 @@ class WsTestClient(GatovidTestClient):
 
     def discard_ok(self, client, position: int = 0) -> Dict:
         callback_args = client.emit("play_discard", position, callback=True)
-        self.assertNotIn("error", callback_args)
+        self.assertCallbackOk(callback_args)
         args = self.get_game_update(client)
         self.assertIn("hand", args)
         self.assertNotIn("current_turn", args)
@@ -362,19 +671,19 @@ class WsTestClient(GatovidTestClient):
 
     def discard_err(self, client, position: int) -> Dict:
         callback_args = client.emit("play_discard", position, callback=True)
-        self.assertIn("error", callback_args)
+        self.assertCallbackErr(callback_args)
         return callback_args
 
     def pass_ok(self, client) -> Dict:
         callback_args = client.emit("play_pass", callback=True)
-        self.assertNotIn("error", callback_args)
+        self.assertCallbackOk(callback_args)
         args = self.get_game_update(client)
         self.assertIn("hand", args)
         return args
 
     def pass_err(self, client) -> Dict:
         callback_args = client.emit("play_pass", callback=True)
-        self.assertIn("error", callback_args)
+        self.assertCallbackErr(callback_args)
         return callback_args
 
     def get_client_from_name(self, clients, name: str) -> object:
@@ -417,13 +726,24 @@ class WsTestClient(GatovidTestClient):
         current_turn = self.get_current_turn(clients[0])
         return self.get_client_from_name(clients, current_turn)
 
+    def get_current_turn_index(self, clients) -> int:
+        """
+        Devuelve la *posición* en `clients` del cliente con el turno actual. Al
+        igual que `get_client_from_name`, supone que están en el mismo orden
+        que `users_data`.
+        """
+
+        return self.player_index[self.get_current_turn(clients[0])]
+
     def clean_messages(self, clients):
         """
-        Limpia los mensajes en el buzón de todos los clientes.
+        Limpia los mensajes en el buzón de todos los clientes. Se vacía la cola
+        del cliente de pruebas directamente, dado que `get_received` la
+        reconstruye entera para devolver los mensajes.
         """
 
         for client in clients:
-            client.get_received()
+            client.queue[client.eio_sid].clear()
 
     def set_custom_deck(self, deck):
         gatovid.game.DECK = deck
@@ -450,12 +770,12 @@ class WsTestClient(GatovidTestClient):
         game = MM.get_match(code)._game
 
         turn_name = args["current_turn"]
-        turn_client = clients[self.player_names.index(args["current_turn"])]
-        turn_player = next(filter(lambda p: p.name == turn_name, game.players))
+        turn_client = clients[self.player_index[args["current_turn"]]]
+        turn_player = game.get_player(turn_name)
         if place_in_self:
             other_player = turn_player
         else:
-            other_player = next(filter(lambda p: p.name != turn_name, game.players))
+            other_player = next(p for p in game.players if p.name != turn_name)
 
         turn_player.hand[0] = card
         other_player.body = target_body
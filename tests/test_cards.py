@@ -2,13 +2,15 @@
 Tests para la lógica del juego
 """
 
+import copy
 import random
 from dataclasses import asdict
-from enum import Enum
 from itertools import permutations
 
 from gatovid.api.game.match import MM
-from gatovid.create_db import GENERIC_USERS_NAME, NUM_GENERIC_USERS
+from gatovid.create_db import GENERIC_USERS_EMAIL, GENERIC_USERS_NAME
+from gatovid.game import Game
+from gatovid.game.actions import PlayCard
 from gatovid.game.body import Body, OrganPile
 from gatovid.game.cards import (
     Color,
@@ -21,33 +23,138 @@ from gatovid.game.cards import (
     Transplant,
     Virus,
 )
+from gatovid.game.common import GameLogicException
+from gatovid.models import User
 
 from .base import WsTestClient
 
-
-def asdict_factory_enums(data):
-    """
-    Factory para obtener el valor de los Enum en lugar de <Color.Yellow:
-    'yellow'> cuando se usa asdict.
-    """
-
-    def convert_value(obj):
-        if isinstance(obj, Enum):
-            return obj.value
-        return obj
-
-    return dict((k, convert_value(v)) for k, v in data)
+# Estados de una pila en el formato de los game_update, compartidos por los
+# tests de interacciones entre cartas.
+PILE_EMPTY = {"modifiers": [], "organ": None}
+PILE_RED = {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}}
+PILE_ALL = {"modifiers": [], "organ": {"card_type": "organ", "color": "all"}}
+PILE_RED_INFECTED = {
+    "modifiers": [{"card_type": "virus", "color": "red"}],
+    "organ": {"card_type": "organ", "color": "red"},
+}
+PILE_RED_INFECTED_ALL = {
+    "modifiers": [{"card_type": "virus", "color": "all"}],
+    "organ": {"card_type": "organ", "color": "red"},
+}
+PILE_ALL_INFECTED = {
+    "modifiers": [{"card_type": "virus", "color": "red"}],
+    "organ": {"card_type": "organ", "color": "all"},
+}
+PILE_RED_PROTECTED = {
+    "modifiers": [{"card_type": "medicine", "color": "red"}],
+    "organ": {"card_type": "organ", "color": "red"},
+}
+PILE_RED_IMMUNIZED = {
+    "modifiers": [
+        {"card_type": "medicine", "color": "red"},
+        {"card_type": "medicine", "color": "red"},
+    ],
+    "organ": {"card_type": "organ", "color": "red"},
+}
+
+
+def organ_pile(color: Color) -> OrganPile:
+    return OrganPile.from_data(organ=Organ(color=color))
+
+
+def infected_pile(color: Color, virus_color: Color = None) -> OrganPile:
+    if virus_color is None:
+        virus_color = color
+
+    return OrganPile.from_data(
+        organ=Organ(color=color),
+        modifiers=[
+            Virus(color=virus_color),
+        ],
+    )
+
+
+def pile_not_empty(pile: OrganPile) -> bool:
+    return not pile.is_empty()
+
+
+# Cuerpos iniciales usados en varios tests. Como la partida modifica los
+# cuerpos, se obtienen siempre copias con `body_fixture`.
+BODY_FIXTURES = {
+    "red": Body.from_data(
+        piles=[OrganPile(), organ_pile(Color.Red), OrganPile(), OrganPile()]
+    ),
+    "red_blue": Body.from_data(
+        piles=[
+            OrganPile(),
+            organ_pile(Color.Red),
+            organ_pile(Color.Blue),
+            OrganPile(),
+        ]
+    ),
+    "red_blue_infected": Body.from_data(
+        piles=[
+            OrganPile(),
+            organ_pile(Color.Red),
+            infected_pile(Color.Blue),
+            OrganPile(),
+        ]
+    ),
+    "green_yellow_infected": Body.from_data(
+        piles=[
+            organ_pile(Color.Green),
+            OrganPile(),
+            infected_pile(Color.Yellow),
+            OrganPile(),
+        ]
+    ),
+}
+
+
+def body_fixture(name: str) -> Body:
+    return copy.deepcopy(BODY_FIXTURES[name])
+
+
+# Cuerpos que deberían tener los jugadores tras usar el Contagio en
+# `test_treatment_infection`, ya en el formato de los game_update. Como no
+# cambian, se generan una única vez.
+EXPECTED_INFECTION = [
+    [pile.to_plain() for pile in body]
+    for body in [
+        [
+            organ_pile(Color.Yellow),
+            organ_pile(Color.Red),
+            organ_pile(Color.Blue),
+            infected_pile(Color.Green),
+        ],
+        [
+            infected_pile(Color.Green, virus_color=Color.All),
+            OrganPile(),
+            infected_pile(Color.Blue),
+            infected_pile(Color.Red, virus_color=Color.All),
+        ],
+        [
+            OrganPile(),
+            OrganPile.from_data(
+                organ=Organ(color=Color.Green),
+                modifiers=[Medicine(color=Color.Green)],
+            ),
+            OrganPile(),
+            infected_pile(Color.Yellow),
+        ],
+    ]
+]
 
 
 class CardsTest(WsTestClient):
-    player_names = [GENERIC_USERS_NAME.format(i) for i in range(NUM_GENERIC_USERS)]
-
     def check_card_interactions(self, card_order, expected_pile_states):
         """
         Se prueba la secuencia de cartas card_order en la pila 0 del jugador 0
         y se comprueba que la interacción sea la deseada (expected_pile_states).
         """
-        clients, code = self.create_game()
+        # Solo intervienen los dos primeros jugadores, y un tercero para
+        # observar la partida.
+        clients, code = self.create_game(players=3)
 
         # Primero se tendrá el game_update inicial
         received = clients[0].get_received()
@@ -59,6 +166,10 @@ class CardsTest(WsTestClient):
         # Usaremos al cliente 0 como target
         target = game.players[0].name
 
+        # Ignoramos los mensajes anteriores en el observador. Después de esto
+        # solo recibirá los de cada carta, que se leen en cada iteración.
+        _ = clients[2].get_received()
+
         for (i, card) in enumerate(card_order):
             # Cambiamos el turno según la carta para cumplir las restricciones
             # de no colocar medicina en el cuerpo de otros, etc.
@@ -69,13 +180,10 @@ class CardsTest(WsTestClient):
 
             # Obtenemos el cliente al que le toca
             turn_player = game.players[game._turn]
-            turn_client = clients[self.player_names.index(turn_player.name)]
+            turn_client = clients[self.player_index[turn_player.name]]
 
             turn_player.hand[0] = card
 
-            # Ignoramos los mensajes anteriores en un cliente cualquiera
-            _ = clients[5].get_received()
-
             # Colocamos la carta en el jugador target. Las cartas se colocarán
             # en el orden de testing_hand y se espera que resulten en la pila 0
             # == expected_pile_states[i]
@@ -90,8 +198,11 @@ class CardsTest(WsTestClient):
             )
             self.assertNotIn("error", callback_args)
 
-            # Recibimos en un cliente cualquiera
-            received = clients[5].get_received()
+            # Recibimos en un cliente cualquiera. Todos los cambios de una
+            # misma acción se envían juntos en un único game_update.
+            received = clients[2].get_received()
+            updates = [msg for msg in received if msg["name"] == "game_update"]
+            self.assertEqual(len(updates), 1)
             _, args = self.get_msg_in_received(received, "game_update", json=True)
             self.assertNotIn("error", args)
 
@@ -114,9 +225,45 @@ class CardsTest(WsTestClient):
             self.assertNotEqual(received, [])
         else:
             self.assertIn("error", callback_args)
-            # No recibimos el game_update
+            # No recibimos el game_update. El cliente de pruebas procesa los
+            # eventos de forma síncrona, así que esto no espera a nada.
             self.assertEqual(received, [])
 
+    def check_can_place_unit(
+        self, target_body, card, place_in_self=False, can_place=True
+    ):
+        """
+        Igual que `check_can_place`, pero aplicando la acción directamente sobre
+        un juego creado en el propio test, sin partida ni WebSockets. Las reglas
+        de colocación dependen únicamente de la lógica del juego, así que no
+        hace falta pasar por el servidor para comprobarlas.
+        """
+        users = [User.query.get(GENERIC_USERS_EMAIL.format(i)) for i in range(2)]
+        game = Game(users, turn_callback=None, enable_ai=False)
+
+        # El otro jugador es cualquiera que no tenga el turno
+        turn_player = game.turn_player()
+        if place_in_self:
+            other_player = turn_player
+        else:
+            other_player = next(p for p in game.players if p is not turn_player)
+
+        turn_player.hand = [card]
+        other_player.body = target_body
+
+        action = PlayCard({"slot": 0, "target": other_player.name, "organ_pile": 0})
+        if can_place:
+            action.apply(turn_player, game)
+
+            # La carta ha quedado en la pila y ya no está en la mano
+            pile = other_player.body.piles[0]
+            placed = [pile.organ] + pile.modifiers
+            self.assertTrue(any(c is card for c in placed))
+            self.assertFalse(any(c is card for c in turn_player.hand))
+        else:
+            with self.assertRaises(GameLogicException):
+                action.apply(turn_player, game)
+
     def test_interactions_cure(self):
         """
         Se prueba a colocar un órgano, infectarlo y curarlo.
@@ -130,14 +277,11 @@ class CardsTest(WsTestClient):
 
         expected_pile_states = [
             # Se coloca el órgano en la pila
-            {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+            PILE_RED,
             # Se infecta el órgano
-            {
-                "modifiers": [{"card_type": "virus", "color": "red"}],
-                "organ": {"card_type": "organ", "color": "red"},
-            },
+            PILE_RED_INFECTED,
             # Se cura el órgano con la medicina
-            {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+            PILE_RED,
         ]
 
         self.check_card_interactions(card_order, expected_pile_states)
@@ -156,14 +300,11 @@ class CardsTest(WsTestClient):
             ],
             expected_pile_states=[
                 # Se coloca el órgano en la pila
-                {"modifiers": [], "organ": {"card_type": "organ", "color": "all"}},
+                PILE_ALL,
                 # Se infecta el órgano
-                {
-                    "modifiers": [{"card_type": "virus", "color": "red"}],
-                    "organ": {"card_type": "organ", "color": "all"},
-                },
+                PILE_ALL_INFECTED,
                 # Se cura el órgano con la medicina
-                {"modifiers": [], "organ": {"card_type": "organ", "color": "all"}},
+                PILE_ALL,
             ],
         )
 
@@ -175,14 +316,11 @@ class CardsTest(WsTestClient):
             ],
             expected_pile_states=[
                 # Se coloca el órgano en la pila
-                {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+                PILE_RED,
                 # Se infecta el órgano
-                {
-                    "modifiers": [{"card_type": "virus", "color": "all"}],
-                    "organ": {"card_type": "organ", "color": "red"},
-                },
+                PILE_RED_INFECTED_ALL,
                 # Se cura el órgano con la medicina
-                {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+                PILE_RED,
             ],
         )
 
@@ -194,14 +332,11 @@ class CardsTest(WsTestClient):
             ],
             expected_pile_states=[
                 # Se coloca el órgano en la pila
-                {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+                PILE_RED,
                 # Se infecta el órgano
-                {
-                    "modifiers": [{"card_type": "virus", "color": "red"}],
-                    "organ": {"card_type": "organ", "color": "red"},
-                },
+                PILE_RED_INFECTED,
                 # Se cura el órgano con la medicina
-                {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+                PILE_RED,
             ],
         )
 
@@ -218,14 +353,11 @@ class CardsTest(WsTestClient):
 
         expected_pile_states = [
             # Se coloca el órgano en la pila
-            {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+            PILE_RED,
             # Se protege el órgano
-            {
-                "modifiers": [{"card_type": "medicine", "color": "red"}],
-                "organ": {"card_type": "organ", "color": "red"},
-            },
+            PILE_RED_PROTECTED,
             # Se destruye la medicina
-            {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+            PILE_RED,
         ]
 
         self.check_card_interactions(card_order, expected_pile_states)
@@ -243,20 +375,11 @@ class CardsTest(WsTestClient):
 
         expected_pile_states = [
             # Se coloca el órgano en la pila
-            {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+            PILE_RED,
             # Se protege el órgano
-            {
-                "modifiers": [{"card_type": "medicine", "color": "red"}],
-                "organ": {"card_type": "organ", "color": "red"},
-            },
+            PILE_RED_PROTECTED,
             # Se inmuniza el órgano
-            {
-                "modifiers": [
-                    {"card_type": "medicine", "color": "red"},
-                    {"card_type": "medicine", "color": "red"},
-                ],
-                "organ": {"card_type": "organ", "color": "red"},
-            },
+            PILE_RED_IMMUNIZED,
         ]
 
         self.check_card_interactions(card_order, expected_pile_states)
@@ -274,14 +397,11 @@ class CardsTest(WsTestClient):
 
         expected_pile_states = [
             # Se coloca el órgano en la pila
-            {"modifiers": [], "organ": {"card_type": "organ", "color": "red"}},
+            PILE_RED,
             # Se infecta el órgano
-            {
-                "modifiers": [{"card_type": "virus", "color": "red"}],
-                "organ": {"card_type": "organ", "color": "red"},
-            },
+            PILE_RED_INFECTED,
             # Se extirpa el órgano
-            {"modifiers": [], "organ": None},
+            PILE_EMPTY,
         ]
 
         self.check_card_interactions(card_order, expected_pile_states)
@@ -302,50 +422,26 @@ class CardsTest(WsTestClient):
         """
         Se prueba que no se pueda colocar un órgano repetido en el cuerpo.
         """
-        b = Body()
-        b.piles[1].set_organ(Organ(color=Color.Red))
-
         test_cases = [
             {
                 "organ": Organ(color=Color.Red),
-                "body": Body.from_data(
-                    piles=[
-                        OrganPile(),
-                        OrganPile.from_data(organ=Organ(color=Color.Red)),
-                        OrganPile(),
-                        OrganPile(),
-                    ]
-                ),
+                "body": body_fixture("red"),
                 "can_place": False,
             },
             {
                 "organ": Organ(color=Color.Green),
-                "body": Body.from_data(
-                    piles=[
-                        OrganPile(),
-                        OrganPile.from_data(organ=Organ(color=Color.Red)),
-                        OrganPile.from_data(organ=Organ(color=Color.Blue)),
-                        OrganPile(),
-                    ]
-                ),
+                "body": body_fixture("red_blue"),
                 "can_place": True,
             },
             {
                 "organ": Organ(color=Color.All),
-                "body": Body.from_data(
-                    piles=[
-                        OrganPile(),
-                        OrganPile.from_data(organ=Organ(color=Color.Red)),
-                        OrganPile.from_data(organ=Organ(color=Color.Blue)),
-                        OrganPile(),
-                    ]
-                ),
+                "body": body_fixture("red_blue"),
                 "can_place": True,
             },
         ]
 
         for test in test_cases:
-            self.check_can_place(
+            self.check_can_place_unit(
                 target_body=test["body"],
                 card=test["organ"],
                 place_in_self=True,
@@ -357,7 +453,7 @@ class CardsTest(WsTestClient):
         Se prueba que no se pueda colocar un modificador sin un órgano en la
         base de la pila.
         """
-        self.check_can_place(
+        self.check_can_place_unit(
             target_body=Body(),
             card=Medicine(color=Color.Red),
             place_in_self=True,
@@ -372,7 +468,7 @@ class CardsTest(WsTestClient):
         b = Body()
         b.piles[0].set_organ(Organ(color=Color.Red))
 
-        self.check_can_place(
+        self.check_can_place_unit(
             target_body=b,
             card=Medicine(color=Color.Red),
             place_in_self=False,
@@ -387,7 +483,7 @@ class CardsTest(WsTestClient):
         b = Body()
         b.piles[0].set_organ(Organ(color=Color.Red))
 
-        self.check_can_place(
+        self.check_can_place_unit(
             target_body=b,
             card=Virus(color=Color.Red),
             place_in_self=True,
@@ -403,13 +499,20 @@ class CardsTest(WsTestClient):
         """
         # HACK: Establecemos siempre la misma semilla para evitar el caso en el
         # que el random genere una mano igual a la que se tenia anteriormente.
+        # El juego usa el generador global, así que se restaura su estado al
+        # terminar para no afectar al resto de tests.
+        random_state = random.getstate()
+        self.addCleanup(random.setstate, random_state)
         random.seed(10)
         clients, code = self.create_game()
 
-        # Primero se tendrá el game_update inicial
+        # Primero se tendrá el game_update inicial, con la mano del cliente 0.
+        # La primera carta se sustituye a continuación, pero el resto son las
+        # que debería conservar.
         received = clients[0].get_received()
         _, args = self.get_msg_in_received(received, "game_update", json=True)
         self.assertNotIn("error", args)
+        last_hand = args["hand"]
 
         game = MM.get_match(code)._game
         # Forzamos el turno al client 0
@@ -417,7 +520,6 @@ class CardsTest(WsTestClient):
 
         turn_player = game.players[game._turn]
         turn_player.hand[0] = LatexGlove()
-        last_hand = list(map(asdict, turn_player.hand.copy()))
 
         # Ignoramos los eventos anteriores en el resto de jugadores y guardamos
         # la mano anterior de estos.
@@ -460,7 +562,7 @@ class CardsTest(WsTestClient):
         """
         Se prueba a usar el tratamiento Error Médico.
         """
-        clients, code = self.create_game()
+        clients, code = self.create_game(players=2)
 
         caller_name = GENERIC_USERS_NAME.format(0)
         target_name = GENERIC_USERS_NAME.format(1)
@@ -476,19 +578,7 @@ class CardsTest(WsTestClient):
 
         caller_player = game.players[game._turn]
         caller_player.hand[0] = MedicalError()
-        caller_player.body = Body.from_data(
-            piles=[
-                OrganPile(),
-                OrganPile.from_data(organ=Organ(color=Color.Red)),
-                OrganPile.from_data(
-                    organ=Organ(color=Color.Blue),
-                    modifiers=[
-                        Virus(color=Color.Blue),
-                    ],
-                ),
-                OrganPile(),
-            ]
-        )
+        caller_player.body = body_fixture("red_blue_infected")
         clients[0].last_body = asdict(caller_player.body)["piles"]
 
         # Ignoramos los eventos anteriores con el target
@@ -497,10 +587,6 @@ class CardsTest(WsTestClient):
         # Guardamos en el cliente el cuerpo anterior
         clients[1].last_body = asdict(Body())["piles"]
 
-        # Ignoramos los eventos anteriores con el resto de los clientes
-        for client in clients[2:]:
-            _ = client.get_received()
-
         # Usamos la carta desde el cliente 0
         callback_args = clients[0].emit(
             "play_card",
@@ -512,10 +598,13 @@ class CardsTest(WsTestClient):
         )
         self.assertNotIn("error", callback_args)
 
-        # Comprobamos que todos los clientes reciben los cuerpos intercambiados.
+        # Comprobamos que todos los clientes reciben los cuerpos intercambiados,
+        # mirando el último game_update recibido por cada uno.
         for client in clients:
             received = client.get_received()
-            _, args = self.get_msg_in_received(received, "game_update", json=True)
+            _, args = self.get_msg_in_received(
+                received, "game_update", json=True, last=True
+            )
             self.assertNotIn("error", args)
 
             self.assertIn("bodies", args)
@@ -528,7 +617,7 @@ class CardsTest(WsTestClient):
         """
         Se prueba a usar el tratamiento Transplante.
         """
-        clients, code = self.create_game()
+        clients, code = self.create_game(players=2)
 
         caller_name = GENERIC_USERS_NAME.format(0)
         target_name = GENERIC_USERS_NAME.format(1)
@@ -541,34 +630,10 @@ class CardsTest(WsTestClient):
         target_player = game.players[(game._turn + 1) % 2]
 
         caller_player.hand[0] = Transplant()
-        caller_player.body = Body.from_data(
-            piles=[
-                OrganPile(),
-                OrganPile.from_data(organ=Organ(color=Color.Red)),
-                OrganPile.from_data(
-                    organ=Organ(color=Color.Blue),
-                    modifiers=[
-                        Virus(color=Color.Blue),
-                    ],
-                ),
-                OrganPile(),
-            ]
-        )
+        caller_player.body = body_fixture("red_blue_infected")
         clients[0].last_pile = asdict(caller_player.body)["piles"][2]
 
-        target_player.body = Body.from_data(
-            piles=[
-                OrganPile.from_data(organ=Organ(color=Color.Green)),
-                OrganPile(),
-                OrganPile.from_data(
-                    organ=Organ(color=Color.Yellow),
-                    modifiers=[
-                        Virus(color=Color.Yellow),
-                    ],
-                ),
-                OrganPile(),
-            ]
-        )
+        target_player.body = body_fixture("green_yellow_infected")
         # Guardamos en el cliente el cuerpo anterior
         clients[1].last_pile = asdict(target_player.body)["piles"][0]
 
@@ -606,7 +671,7 @@ class CardsTest(WsTestClient):
         """
         Se prueba a usar el tratamiento Ladrón de órganos.
         """
-        clients, code = self.create_game()
+        clients, code = self.create_game(players=2)
 
         caller_name = GENERIC_USERS_NAME.format(0)
         target_name = GENERIC_USERS_NAME.format(1)
@@ -619,33 +684,9 @@ class CardsTest(WsTestClient):
         target_player = game.players[(game._turn + 1) % 2]
 
         caller_player.hand[0] = OrganThief()
-        caller_player.body = Body.from_data(
-            piles=[
-                OrganPile(),
-                OrganPile.from_data(organ=Organ(color=Color.Red)),
-                OrganPile.from_data(
-                    organ=Organ(color=Color.Blue),
-                    modifiers=[
-                        Virus(color=Color.Blue),
-                    ],
-                ),
-                OrganPile(),
-            ]
-        )
+        caller_player.body = body_fixture("red_blue_infected")
 
-        target_player.body = Body.from_data(
-            piles=[
-                OrganPile.from_data(organ=Organ(color=Color.Green)),
-                OrganPile(),
-                OrganPile.from_data(
-                    organ=Organ(color=Color.Yellow),
-                    modifiers=[
-                        Virus(color=Color.Yellow),
-                    ],
-                ),
-                OrganPile(),
-            ]
-        )
+        target_player.body = body_fixture("green_yellow_infected")
         # Guardamos en el cliente el cuerpo anterior
         clients[1].last_pile = asdict(target_player.body)["piles"][2]
 
@@ -692,78 +733,37 @@ class CardsTest(WsTestClient):
         # Forzamos el turno al client 0
         game._turn = 0
 
-        def organ(color: Color) -> OrganPile:
-            return OrganPile.from_data(organ=Organ(color=color))
-
-        def infected_organ(color: Color, virus_color: Color = None) -> OrganPile:
-            if virus_color is None:
-                virus_color = color
-
-            return OrganPile.from_data(
-                organ=Organ(color=color),
-                modifiers=[
-                    Virus(color=virus_color),
-                ],
-            )
-
+        # Cuerpos iniciales de los jugadores. Se construyen en cada test porque
+        # la partida los modifica.
         bodies = [
-            {
-                "have": [
-                    infected_organ(Color.Yellow),
-                    infected_organ(Color.Red, virus_color=Color.All),
-                    infected_organ(Color.Blue),
-                    # El virus de este no se debería colocar en ningún sitio
-                    infected_organ(Color.Green),
-                ],
-                "expected": [
-                    organ(Color.Yellow),
-                    organ(Color.Red),
-                    organ(Color.Blue),
-                    infected_organ(Color.Green),
-                ],
-            },
-            {
-                "have": [
-                    # No se debería colocar en esta
-                    infected_organ(Color.Green, virus_color=Color.All),
-                    OrganPile(),
-                    organ(Color.Blue),
-                    # Se debería colocar el multicolor
-                    organ(Color.Red),
-                ],
-                "expected": [
-                    infected_organ(Color.Green, virus_color=Color.All),
-                    OrganPile(),
-                    infected_organ(Color.Blue),
-                    infected_organ(Color.Red, virus_color=Color.All),
-                ],
-            },
-            {
-                "have": [
-                    OrganPile(),
-                    # No se debería colocar en este
-                    OrganPile.from_data(
-                        organ=Organ(color=Color.Green),
-                        modifiers=[Medicine(color=Color.Green)],
-                    ),
-                    OrganPile(),
-                    organ(Color.Yellow),
-                ],
-                "expected": [
-                    OrganPile(),
-                    OrganPile.from_data(
-                        organ=Organ(color=Color.Green),
-                        modifiers=[Medicine(color=Color.Green)],
-                    ),
-                    OrganPile(),
-                    infected_organ(Color.Yellow),
-                ],
-            },
+            [
+                infected_pile(Color.Yellow),
+                infected_pile(Color.Red, virus_color=Color.All),
+                infected_pile(Color.Blue),
+                # El virus de este no se debería colocar en ningún sitio
+                infected_pile(Color.Green),
+            ],
+            [
+                # No se debería colocar en esta
+                infected_pile(Color.Green, virus_color=Color.All),
+                OrganPile(),
+                organ_pile(Color.Blue),
+                # Se debería colocar el multicolor
+                organ_pile(Color.Red),
+            ],
+            [
+                OrganPile(),
+                # No se debería colocar en este
+                OrganPile.from_data(
+                    organ=Organ(color=Color.Green),
+                    modifiers=[Medicine(color=Color.Green)],
+                ),
+                OrganPile(),
+                organ_pile(Color.Yellow),
+            ],
         ]
 
-        clients_order = list(
-            map(lambda p: self.player_names.index(p.name), game.players)
-        )
+        clients_order = [self.player_index[p.name] for p in game.players]
 
         # Para todos los clientes, inicializamos su cuerpo al cuerpo de pruebas
         # y le damos la carta de contagio al cliente 0.
@@ -773,7 +773,7 @@ class CardsTest(WsTestClient):
 
             if which_client == 0:
                 player.hand[0] = Infection()
-            player.body = Body.from_data(piles=bodies[i]["have"])
+            player.body = Body.from_data(piles=bodies[i])
 
         # Ignoramos los eventos anteriores con los clientes
         for client in clients:
@@ -794,13 +794,7 @@ class CardsTest(WsTestClient):
 
             self.assertIn("bodies", args)
             self.assertIn(player.name, args["bodies"])
-            expected = list(
-                map(
-                    lambda b: asdict(b, dict_factory=asdict_factory_enums),
-                    bodies[i]["expected"],
-                )
-            )
-            self.assertEqual(args["bodies"][player.name], expected)
+            self.assertEqual(args["bodies"][player.name], EXPECTED_INFECTION[i])
 
     def test_return_to_deck(self):
         """
@@ -821,8 +815,7 @@ class CardsTest(WsTestClient):
         ]
         # Rellenamos las restantes con órganos. NOTE: no hacen falta 68 cartas
         # solo para 2 jugadores.
-        for i in range(TOTAL_CARDS - 4):
-            custom_deck.append(Organ(color=Color.Red))
+        custom_deck.extend(Organ(color=Color.Red) for _ in range(TOTAL_CARDS - 4))
 
         self.set_custom_deck(custom_deck)
 
@@ -847,12 +840,14 @@ class CardsTest(WsTestClient):
             self.assertIn("error", callback_args)
 
         def try_use(slot, pile_cond, search_in, target) -> bool:
-            pile_slot = None
-
-            for (p_slot, pile) in enumerate(player.body.piles):
-                if pile_cond(pile):
-                    pile_slot = p_slot
-                    break
+            pile_slot = next(
+                (
+                    p_slot
+                    for (p_slot, pile) in enumerate(player.body.piles)
+                    if pile_cond(pile)
+                ),
+                None,
+            )
 
             if pile_slot is not None:
                 # Primero intenta las opciones inválidas
@@ -876,22 +871,21 @@ class CardsTest(WsTestClient):
         game._turn = 0
 
         def total_cards() -> int:
-            count = len(game.deck)
-            for player in game.players:
-                count += len(player.hand)
-                for pile in player.body.piles:
-                    if pile.is_empty():
-                        continue
-                    count += 1 + len(pile.modifiers)
-            return count
+            return len(game.deck) + sum(
+                len(player.hand)
+                + sum(
+                    1 + len(pile.modifiers)
+                    for pile in player.body.piles
+                    if not pile.is_empty()
+                )
+                for player in game.players
+            )
 
         # Ignoramos todos los mensajes anteriores
         for client in clients:
             _ = client.get_received()
 
-        clients_order = list(
-            map(lambda p: self.player_names.index(p.name), game.players)
-        )
+        clients_order = [self.player_index[p.name] for p in game.players]
 
         for i in range(100):
             # Evitamos problemas con los saltos de turno
@@ -905,41 +899,44 @@ class CardsTest(WsTestClient):
             player = game.players[p]
             other_player = game.players[(p + 1) % 2]
 
-            card_types = list(map(lambda c: c.card_type, player.hand))
+            # Primera posición de cada tipo de carta en la mano
+            card_slots = {}
+            for (slot, card) in enumerate(player.hand):
+                card_slots.setdefault(card.card_type, slot)
 
-            if "treatment" in card_types:
-                slot = card_types.index("treatment")
+            slot = card_slots.get("treatment")
+            if slot is not None:
                 callback_args = client.emit("play_card", {"slot": slot}, callback=True)
                 self.assertNotIn("error", callback_args)
                 continue
 
-            if "organ" in card_types:
-                slot = card_types.index("organ")
+            slot = card_slots.get("organ")
+            if slot is not None:
                 if player.body.organ_unique(player.hand[slot]):
                     if try_use(
                         slot=slot,
                         search_in=player.body.piles,
-                        pile_cond=lambda p: p.is_empty(),
+                        pile_cond=OrganPile.is_empty,
                         target=player.name,
                     ):
                         continue
 
-            if "virus" in card_types:
-                slot = card_types.index("virus")
+            slot = card_slots.get("virus")
+            if slot is not None:
                 if try_use(
                     slot=slot,
                     search_in=other_player.body.piles,
-                    pile_cond=lambda p: not p.is_empty(),
+                    pile_cond=pile_not_empty,
                     target=other_player.name,
                 ):
                     continue
 
-            if "medicine" in card_types:
-                slot = card_types.index("medicine")
+            slot = card_slots.get("medicine")
+            if slot is not None:
                 if try_use(
                     slot=slot,
                     search_in=player.body.piles,
-                    pile_cond=lambda p: not p.is_empty(),
+                    pile_cond=pile_not_empty,
                     target=player.name,
                 ):
                     continue
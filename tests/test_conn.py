@@ -14,10 +14,9 @@ Desconexión por error o botón de reanudar más tarde pulsado:
   partidas privadas no se eliminan jugadores AFK.
 """
 
-import time
+from itertools import cycle, islice
 from typing import Dict, Optional
 
-from gatovid.create_db import GENERIC_USERS_NAME
 from gatovid.models import BOT_PICTURE_ID
 from gatovid.util import get_logger
 
@@ -27,6 +26,13 @@ logger = get_logger(__name__)
 
 
 class ConnTest(WsTestClient):
+    def setUp(self):
+        super().setUp()
+
+        # Los turnos y el matchmaking avanzan solo cuando se espera en la
+        # prueba, sin depender del tiempo real.
+        self.use_virtual_clock()
+
     def active_wait_turns(
         self,
         clients,
@@ -36,8 +42,9 @@ class ConnTest(WsTestClient):
         receiver: Optional[object] = None,
     ) -> (int, Dict):
         """
-        Espera activa de un turno para evitar problemas de sincronización con
-        `time.sleep(X)`.
+        Espera a que pasen `total_skips` turnos, despertando con cada mensaje
+        recibido para evitar problemas de sincronización con `time.sleep(X)`.
+        Con el reloj virtual, cada espera ejecuta el siguiente fin de turno.
 
         Se puede configurar un receptor en concreto y el turno desde el que se
         parte.
@@ -48,31 +55,36 @@ class ConnTest(WsTestClient):
         turn = starting_turn
         if turn is None:
             # Para saber el orden de los turnos
-            starting_turn = self.get_current_turn_client(clients)
-            turn = clients.index(starting_turn)
+            turn = self.get_current_turn_index(clients)
 
         if receiver is None:
             receiver = clients[0]
 
-        self.clean_messages(clients)
-        for i in range(total_skips):
-            while True:
-                received = receiver.get_received()
-                if len(received) > 0:
-                    self.assertEqual(len(received), 1)
-                    break
-
-                time.sleep(turn_timeout / 5)  # Para evitar saturar al servidor
+        # Turnos sucesivos a partir del actual
+        next_turns = islice(cycle(range(len(clients))), turn + 1, None)
 
-            turn = (turn + 1) % len(clients)
-            expected = GENERIC_USERS_NAME.format(turn)
-            logger.info(f">> Turn {turn} now (player {expected})")
-
-            _, args = self.get_msg_in_received(
-                received, "game_update", json=True, last=True
-            )
-            self.assertIsNotNone(args)
-            self.assertEqual(args.get("current_turn"), expected)
+        self.clean_messages(clients)
+        skips = 0
+        while skips < total_skips:
+            # Se despierta en cuanto llega el mensaje del siguiente turno. El
+            # límite es solo para que el test falle en vez de quedarse
+            # bloqueado si no llega nunca. Si se han acumulado varios turnos,
+            # se procesan todos de una vez.
+            received = self.wait_received(receiver, turn_timeout * 10)
+            updates = self.index_received(received, json=True)["game_update"]
+            self.assertNotEqual(updates, [])
+
+            for args in updates:
+                turn = next(next_turns)
+                expected = self.player_names[turn]
+                logger.info(f">> Turn {turn} now (player {expected})")
+
+                self.assertEqual(args.get("current_turn"), expected)
+                skips += 1
+
+        # No pueden haber pasado más turnos de los esperados, o se perdería la
+        # cuenta del turno actual.
+        self.assertEqual(skips, total_skips)
 
         return turn, args
 
@@ -85,14 +97,15 @@ class ConnTest(WsTestClient):
 
         turn = initial_turn
         if turn is None:
-            starting_turn = self.get_current_turn_client(clients)
-            turn = clients.index(starting_turn)
+            turn = self.get_current_turn_index(clients)
 
+        turns = islice(cycle(range(len(clients))), turn, None)
         for i in range(num_turns):
+            turn = next(turns)
             callback(turn, i, clients[turn])
-            turn = (turn + 1) % len(clients)
 
-        return turn
+        # El turno siguiente al último iterado
+        return next(turns)
 
     def iter_remaining(
         self, clients, i: int, turn: int, include_self: Optional[bool] = False
@@ -106,15 +119,14 @@ class ConnTest(WsTestClient):
         """
 
         clients_left = len(clients) - i
+        start = turn
         if not include_self:
             clients_left -= 1
+            start = (turn + 1) % len(clients)
 
-        for remaining in range(clients_left):
-            remaining_client = (turn + remaining) % len(clients)
-            if not include_self:
-                remaining_client = (remaining_client + 1) % len(clients)
-
-            yield clients[remaining_client]
+        # Clientes en orden de turno a partir de `start`
+        rotated = clients[start:] + clients[:start]
+        yield from rotated[:clients_left]
 
     def check_game_is_cancelled(self, client) -> None:
         received = client.get_received()
@@ -128,22 +140,17 @@ class ConnTest(WsTestClient):
         """
 
         if can_pause:
-            callback_args = client.emit("pause_game", True, callback=True)
-            self.assertIn("error", callback_args)
+            self.emit_err(client, "pause_game", True)
 
         # Ya no se puede jugar
-        callback_args = client.emit("play_discard", 0, callback=True)
-        self.assertIn("error", callback_args)
+        self.emit_err(client, "play_discard", 0)
 
         # Tampoco podrá volver a entrar a la partida
-        callback_args = client.emit("join", code, callback=True)
-        self.assertIn("error", callback_args)
+        self.emit_err(client, "join", code)
 
     def check_public_connection_works(self, client) -> None:
-        callback_args = client.emit("play_discard", 0, callback=True)
-        self.assertNotIn("error", callback_args)
-        callback_args = client.emit("play_pass", callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(client, "play_discard", 0)
+        self.emit_ok(client, "play_pass")
 
     def check_private_connection_works(self, client, start: bool) -> None:
         """
@@ -154,32 +161,29 @@ class ConnTest(WsTestClient):
         # Se pueden descartar cartas sin problemas
         if start:
             # En la primera iteración descarta
-            callback_args = client.emit("play_discard", 0, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "play_discard", 0)
         else:
             # Y en la segunda iteración pasa el turno
-            callback_args = client.emit("play_pass", callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "play_pass")
 
         # Se puede pausar y reanudar sin problemas
-        callback_args = client.emit("pause_game", True, callback=True)
-        self.assertNotIn("error", callback_args)
-        callback_args = client.emit("pause_game", False, callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(client, "pause_game", True)
+        self.emit_ok(client, "pause_game", False)
 
     def check_replaced_by_ai(self, args, kicked_name: str) -> None:
         # Comprobando que la información del usuario kickeado es la
         # esperada.
-        kicked_player = list(
-            filter(lambda d: d["name"] == kicked_name, args["players"])
-        )
-        self.assertEqual(len(kicked_player), 1)
-        self.assertEqual(kicked_player[0].get("is_ai"), True)
-        self.assertEqual(kicked_player[0].get("picture"), BOT_PICTURE_ID)
+        players = {player["name"]: player for player in args["players"]}
+        # Los nombres no se pueden repetir
+        self.assertEqual(len(players), len(args["players"]))
+
+        self.assertIn(kicked_name, players)
+        self.assertEqual(players[kicked_name].get("is_ai"), True)
+        self.assertEqual(players[kicked_name].get("picture"), BOT_PICTURE_ID)
 
     def check_removed(self, args, name: str) -> None:
-        player = list(filter(lambda d: d["name"] == name, args["players"]))
-        self.assertEqual(len(player), 0)
+        names = {player["name"] for player in args["players"]}
+        self.assertNotIn(name, names)
 
     def test_kicked_public(self):
         """
@@ -206,12 +210,13 @@ class ConnTest(WsTestClient):
                 self.check_game_is_cancelled(client)
                 return
 
-            # El último usuario antes de que se cancele la partida se hace con
-            # una espera pasiva, dado que lo que se recibirá será un
-            # game_cancelled y no un current_turn.
+            # El último usuario antes de que se cancele la partida espera
+            # directamente al game_cancelled, dado que no recibirá un
+            # current_turn. La cancelación llega en cuanto se le termina el
+            # turno, con el mismo margen que en `active_wait_turns`.
             if i == len(clients) - 2:
                 logger.info(">> Last player left before cancel")
-                self.wait_matchmaking_time()
+                self.wait_msg(client, "game_cancelled", timeout * 10)
                 self.check_game_is_cancelled(client)
                 return
 
@@ -223,7 +228,7 @@ class ConnTest(WsTestClient):
             # se copia lo del bucle posterior para el mismo cliente.
             self.assertIsNotNone(args)
             self.assertIn("players", args)
-            kicked_name = GENERIC_USERS_NAME.format(turn)
+            kicked_name = self.player_names[turn]
             self.check_replaced_by_ai(args, kicked_name)
 
             # Todos los clientes que queden en la partida habrán recibido un
@@ -235,14 +240,13 @@ class ConnTest(WsTestClient):
 
                 # Comprobando que la información del usuario kickeado es la
                 # esperada.
-                kicked_name = GENERIC_USERS_NAME.format(turn)
+                kicked_name = self.player_names[turn]
                 self.check_replaced_by_ai(args, kicked_name)
 
             self.check_user_has_abandoned(client, code, can_pause=False)
 
             # Al final se sale de la partida para limpiar la sesión.
-            callback_args = client.emit("leave", callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "leave")
 
         # En la siguiente iteración los usuarios son eliminados
         logger.info(">>>>> Starting player removal loop")
@@ -279,8 +283,7 @@ class ConnTest(WsTestClient):
                 return
 
             self.clean_messages(clients)
-            callback_args = client.emit("leave", callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "leave")
             self.check_user_has_abandoned(client, code, can_pause=True)
 
             # El último usuario en abandonar que ha causado la cancelación no
@@ -303,7 +306,7 @@ class ConnTest(WsTestClient):
                 self.assertIn("players", args)
 
                 # Comprobando que no aparece el usuario que ha abandonado.
-                name = GENERIC_USERS_NAME.format(turn)
+                name = self.player_names[turn]
                 self.check_removed(args, name)
 
         logger.info(">> Starting loop that should work")
@@ -332,8 +335,7 @@ class ConnTest(WsTestClient):
                 return
 
             self.clean_messages(clients)
-            callback_args = client.emit("leave", callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "leave")
             self.check_user_has_abandoned(client, code, can_pause=False)
 
             # El último usuario en abandonar que ha causado la cancelación no
@@ -355,7 +357,7 @@ class ConnTest(WsTestClient):
                 self.assertIsNotNone(args)
                 self.assertIn("players", args)
 
-                kicked_name = GENERIC_USERS_NAME.format(turn)
+                kicked_name = self.player_names[turn]
                 self.check_replaced_by_ai(args, kicked_name)
 
         # Ahora se abandona manualmente y ya no se podrá hacer nada en la
@@ -384,8 +386,7 @@ class ConnTest(WsTestClient):
             logger.info(">> Trying after reconnect")
             # Reconexión, no debería funcionar
             client = self.client_reconnect(clients, client)
-            callback_args = client.emit("join", code, callback=True)
-            self.assertIn("error", callback_args)
+            self.emit_err(client, "join", code)
 
         self.turn_iter(clients, len(clients), turn_with_disconnect)
 
@@ -412,18 +413,16 @@ class ConnTest(WsTestClient):
 
             # Unión de nuevo a la partida
             self.clean_messages(clients)
-            callback_args = client.emit("join", code, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "join", code)
 
             # Tendría que llegar directamente un start_game y después un
             # game_update con el estado completo del juego.
-            received = client.get_received()
-            _, args = self.get_msg_in_received(received, "start_game", json=True)
-            self.assertIsNotNone(args)
-            _, args = self.get_msg_in_received(received, "game_update", json=True)
+            received = self.index_received(client.get_received(), json=True)
+            self.assertIn("start_game", received)
+            self.assertIn("game_update", received)
 
             # Comprueba todos los campos devueltos y que son los esperados.
-            self.assertIsNotNone(args)
+            args = received["game_update"][0]
 
             self.assertIn("hand", args)
             self.assertEqual(len(args["hand"]), 2)  # Se descartó al inicio
@@ -442,7 +441,7 @@ class ConnTest(WsTestClient):
             self.assertEqual(len(args["bodies"]), len(clients))
 
             self.assertIn("current_turn", args)
-            self.assertEqual(args["current_turn"], GENERIC_USERS_NAME.format(turn))
+            self.assertEqual(args["current_turn"], self.player_names[turn])
 
             self.assertIn("finished", args)
             self.assertNotIn("leaderboard", args)
@@ -454,17 +453,13 @@ class ConnTest(WsTestClient):
 
             # Comprobación de que recibe mensajes de otros
             self.clean_messages(clients)
-            callback_args = clients[next_turn].emit("pause_game", True, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(clients[next_turn], "pause_game", True)
             # Compara el mensaje propio con el del cliente que ha re-entrado
-            received = clients[next_turn].get_received()
-            _, expected = self.get_msg_in_received(received, "game_update", json=True)
-            received = clients[turn].get_received()
-            _, args = self.get_msg_in_received(received, "game_update", json=True)
+            expected = self.get_game_update(clients[next_turn])
+            args = self.get_game_update(clients[turn])
             self.assertEqual(args, expected)
             # Restaura la pausa
-            callback_args = clients[next_turn].emit("pause_game", False, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(clients[next_turn], "pause_game", False)
 
         self.turn_iter(clients, len(clients), turn_with_disconnect)
 
@@ -478,7 +473,7 @@ class ConnTest(WsTestClient):
         client = self.create_client(self.users_data[1])
 
         # Creamos la partida
-        callback_args = client_leader.emit("create_game", callback=True)
+        self.emit_ok(client_leader, "create_game")
         received = client_leader.get_received()
         _, args = self.get_msg_in_received(received, "create_game", json=True)
         code = args["code"]
@@ -487,12 +482,10 @@ class ConnTest(WsTestClient):
         client = self.client_reconnect([client_leader, client], client)
 
         # Unión a la partida
-        callback_args = client.emit("join", code, callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(client, "join", code)
 
         # Empezamos la partida sin problemas
-        callback_args = client_leader.emit("start_game", callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(client_leader, "start_game")
 
     def test_reconnect_when_searching(self):
         """
@@ -507,8 +500,7 @@ class ConnTest(WsTestClient):
 
         # Ambos buscan partida y entran juntos a la misma.
         for client in (client_leader, client):
-            callback_args = client.emit("search_game", callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "search_game")
 
         # Antes de unirse se reconecta
         client = self.client_reconnect([client_leader, client], client)
@@ -520,8 +512,7 @@ class ConnTest(WsTestClient):
         self.assertIsNone(args)
 
         # Vuelve a buscar partida
-        callback_args = client.emit("search_game", callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(client, "search_game")
         self.wait_matchmaking_time()
 
         # Ahora sí que comienza la partida
@@ -531,8 +522,7 @@ class ConnTest(WsTestClient):
             _, args = self.get_msg_in_received(received, "found_game", json=True)
             self.assertIn("code", args)
             code = args["code"]
-            callback_args = client.emit("join", code, callback=True)
-            self.assertNotIn("error", callback_args)
+            self.emit_ok(client, "join", code)
 
     def test_leave_pause(self):
         """
@@ -545,16 +535,12 @@ class ConnTest(WsTestClient):
         self.clean_messages(clients)
 
         # Un usuario pausa y los demás reciben el mensaje
-        callback_args = clients[0].emit("pause_game", True, callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(clients[0], "pause_game", True)
         args = self.get_game_update(clients[1])
-        self.assertEqual(
-            args, {"paused": True, "paused_by": GENERIC_USERS_NAME.format(0)}
-        )
+        self.assertEqual(args, {"paused": True, "paused_by": self.player_names[0]})
 
         # Ahora abandona la partida y debería tenerse otro mensaje
-        callback_args = clients[0].emit("leave", callback=True)
-        self.assertNotIn("error", callback_args)
+        self.emit_ok(clients[0], "leave")
         args = self.get_game_update(clients[1])
         self.assertEqual(args.get("paused"), False)
-        self.assertEqual(args.get("paused_by"), GENERIC_USERS_NAME.format(0))
+        self.assertEqual(args.get("paused_by"), self.player_names[0])
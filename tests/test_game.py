@@ -2,10 +2,7 @@
 Tests para la lógica del juego
 """
 
-import time
-
 from gatovid.api.game.match import MM
-from gatovid.create_db import GENERIC_USERS_NAME
 from gatovid.game import Body
 from gatovid.game.cards import Color, Organ
 from gatovid.util import get_logger
@@ -23,16 +20,22 @@ class GameTest(WsTestClient):
 
         clients, code = self.create_game()
 
+        # Cada jugador tendrá su información básica, y él mismo habrá recibido
+        # su tablero.
+        base_players = [
+            {"name": name, "picture": 0} for name in self.player_names[: len(clients)]
+        ]
+
         for cur_client_num, client in enumerate(clients):
+            received = self.index_received(client.get_received(), json=True)
+
             # Primero debería haberse recibido un mensaje de `start_game`
-            received = client.get_received()
-            _, args = self.get_msg_in_received(received, "start_game", json=True)
-            self.assertIsNotNone(args)
+            self.assertIn("start_game", received)
 
             # Después, debería haberse recibido un mensaje con el estado inicial
             # del juego.
-            _, args = self.get_msg_in_received(received, "game_update", json=True)
-            self.assertIsNotNone(args)
+            self.assertIn("game_update", received)
+            args = received["game_update"][0]
 
             # La mano y el turno serán aleatorios
             self.assertIn("hand", args)
@@ -40,17 +43,8 @@ class GameTest(WsTestClient):
 
             # Los jugadores de la partida sí que se pueden saber
             self.assertIn("players", args)
-            expected_players = []
-            for client_num in range(len(clients)):
-                # Cada jugador tendrá su información básica, y él mismo habrá
-                # recibido su tablero.
-                data = {
-                    "name": GENERIC_USERS_NAME.format(client_num),
-                    "picture": 0,
-                }
-                if client_num == cur_client_num:
-                    data["board"] = 0
-                expected_players.append(data)
+            expected_players = [dict(player) for player in base_players]
+            expected_players[cur_client_num]["board"] = 0
 
             self.assertEqual(args["players"], expected_players)
 
@@ -67,7 +61,7 @@ class GameTest(WsTestClient):
 
         for (i, client) in enumerate(clients):
             # Ignoramos los eventos anteriores
-            _ = client.get_received()
+            self.clean_messages([client])
 
             # Pausamos
             callback_args = client.emit("pause_game", True, callback=True)
@@ -77,7 +71,7 @@ class GameTest(WsTestClient):
             self.assertIn("paused", args)
             self.assertEqual(args["paused"], True)
             self.assertIn("paused_by", args)
-            self.assertEqual(args["paused_by"], GENERIC_USERS_NAME.format(i))
+            self.assertEqual(args["paused_by"], self.player_names[i])
 
             # Reanudamos
             callback_args = client.emit("pause_game", False, callback=True)
@@ -91,9 +85,7 @@ class GameTest(WsTestClient):
         clients, code = self.create_game()
 
         # Ignoramos los eventos anteriores
-        _ = clients[0].get_received()
-        _ = clients[1].get_received()
-        _ = clients[2].get_received()
+        self.clean_messages(clients[:3])
 
         # Pausamos con el cliente 0
         callback_args = clients[0].emit("pause_game", True, callback=True)
@@ -104,7 +96,7 @@ class GameTest(WsTestClient):
         self.assertIn("paused", args)
         self.assertEqual(args["paused"], True)
         self.assertIn("paused_by", args)
-        self.assertEqual(args["paused_by"], GENERIC_USERS_NAME.format(0))
+        self.assertEqual(args["paused_by"], self.player_names[0])
 
         # Intentamos reanudar con el cliente 2
         callback_args = clients[2].emit("pause_game", False, callback=True)
@@ -123,7 +115,7 @@ class GameTest(WsTestClient):
         self.assertIn("paused", args)
         self.assertEqual(args["paused"], False)
         self.assertIn("paused_by", args)
-        self.assertEqual(args["paused_by"], GENERIC_USERS_NAME.format(0))
+        self.assertEqual(args["paused_by"], self.player_names[0])
 
     def test_auto_resume(self):
         """
@@ -131,10 +123,10 @@ class GameTest(WsTestClient):
         automáticamente.
         """
 
+        # La espera de la pausa se hace sobre el reloj virtual
+        self.use_virtual_clock()
         clients, code = self.create_game()
 
-        # Establecemos el tiempo para que se cancele la pausa a 1 segundo para
-        # no tener que esperar tanto.
         self.set_pause_timeout(1)
 
         # Pausamos con el cliente 0
@@ -142,7 +134,7 @@ class GameTest(WsTestClient):
         self.assertNotIn("error", callback_args)
 
         # Ignoramos los eventos anteriores
-        _ = clients[1].get_received()
+        self.clean_messages([clients[1]])
 
         # Esperamos al tiempo de expiración de la pausa
         self.wait_pause_timeout()
@@ -152,7 +144,7 @@ class GameTest(WsTestClient):
         self.assertIn("paused", args)
         self.assertEqual(args["paused"], False)
         self.assertIn("paused_by", args)
-        self.assertEqual(args["paused_by"], GENERIC_USERS_NAME.format(0))
+        self.assertEqual(args["paused_by"], self.player_names[0])
 
     def test_auto_pass(self):
         """
@@ -166,6 +158,7 @@ class GameTest(WsTestClient):
         comprueba si ha cambiado.
         """
 
+        self.use_virtual_clock()
         self.set_turn_timeout(0.2)
         clients, code = self.create_game()
 
@@ -177,7 +170,7 @@ class GameTest(WsTestClient):
             self.clean_messages(clients)
             client = self.get_client_from_name(clients, start_turn)
 
-            self.wait_turn_timeout()
+            self.wait_turn_timeout(client)
             args = self.get_game_update(client)
             self.assertIn("hand", args)
             self.assertIn("current_turn", args)
@@ -192,6 +185,9 @@ class GameTest(WsTestClient):
         cuando se pausa la partida.
         """
 
+        # Las esperas se hacen sobre el reloj virtual, de forma que el tiempo
+        # del turno que pasa entre pausas es exacto.
+        self.use_virtual_clock()
         self.set_turn_timeout(0.3)
         clients, code = self.create_game()
 
@@ -221,15 +217,15 @@ class GameTest(WsTestClient):
             # El tiempo dormido entre pausas no debería contar
             pause(True)
             recv_pause()
-            time.sleep(0.4)
+            self.wait_secs(0.4)
             pause(False)
             recv_pause()
 
-            time.sleep(0.05)
+            self.wait_secs(0.05)
             logger.info(f">> Iteration {i + 1}/4 done, slept {0.1 * (i + 1)}/0.2s")
 
         # Duerme el tiempo restante como margen fuera del bucle
-        time.sleep(0.15)
+        self.wait_secs(0.15)
         logger.info(">> Done waiting")
 
         end_turn = self.get_current_turn(clients[0])
@@ -299,6 +295,7 @@ class GameTest(WsTestClient):
         esto.
         """
 
+        self.use_virtual_clock()
         self.set_turn_timeout(0.5)
         clients, code = self.create_game()
 
@@ -316,7 +313,7 @@ class GameTest(WsTestClient):
 
         # Espera el tiempo de partida y comprueba que la mano no sea la misma,
         # comparando las instancias y no los datos de las cartas.
-        self.wait_turn_timeout()
+        self.wait_turn_timeout(client)
         end_hand = [id(card) for card in current_player.hand]
         self.assertNotEqual(start_hand, end_hand)
 
@@ -334,7 +331,7 @@ class GameTest(WsTestClient):
         # la posición 0) no ha sido modificada, es decir, que únicamente se han
         # descartado las dos cartas indicadas en el proceso de descarte.
         # esperado.
-        self.wait_turn_timeout()
+        self.wait_turn_timeout(client)
         end_hand = [id(card) for card in current_player.hand]
         self.assertEqual(start_hand[0], end_hand[0])
 
@@ -407,9 +404,7 @@ class GameTest(WsTestClient):
         for client in clients:
             _ = client.get_received()
 
-        clients_order = list(
-            map(lambda p: self.player_names.index(p.name), game.players)
-        )
+        clients_order = [self.player_index[p.name] for p in game.players]
 
         players_finished = []
         leaderboards_received = 0
@@ -492,6 +487,7 @@ class GameTest(WsTestClient):
         el juego de forma que se pueda componer únicamente de IA.
         """
 
+        self.use_virtual_clock()
         self.set_turn_timeout(0.5)
         clients, code = self.create_game()
 
@@ -501,4 +497,4 @@ class GameTest(WsTestClient):
             player.is_ai = True
 
         # Ejecución de varios turnos
-        time.sleep(5)
+        self.wait_secs(5)
@@ -16,14 +16,13 @@ from .base import WsTestClient
 
 logger = get_logger(__name__)
 
-users_data = []
-for i in range(NUM_GENERIC_USERS):
-    users_data.append(
-        {
-            "email": GENERIC_USERS_EMAIL.format(i),
-            "password": GENERIC_USERS_PASSWORD,
-        }
-    )
+users_data = tuple(
+    {
+        "email": GENERIC_USERS_EMAIL.format(i),
+        "password": GENERIC_USERS_PASSWORD,
+    }
+    for i in range(NUM_GENERIC_USERS)
+)
 
 
 class WsTest(WsTestClient):